@@ -1,6 +1,9 @@
 import math
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 from pydantic import BaseModel
+from utils.pointarray import PointArray, as_point_array
 
 class Point(BaseModel):
     name: str
@@ -19,17 +22,21 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * c
 
 # ADSA: Build cost matrix for TSP 
-def build_cost_matrix(points: List[Point]):
+def build_cost_matrix(points: List[Point] | PointArray):
+    points = as_point_array(points)
+    lats, lngs = points.lats, points.lngs
     n = len(points)
     cost_matrix = [[0.0] * n for _ in range(n)]
     for i in range(n):
         for j in range(n):
             if i != j:
-                cost_matrix[i][j] = haversine(points[i].lat, points[i].lng, points[j].lat, points[j].lng)
+                cost_matrix[i][j] = haversine(lats[i], lngs[i], lats[j], lngs[j])
     return cost_matrix
 
 # ADSA: Nearest Neighbor TSP approximation for the "shortest" route (using straight-line distances)
-def tsp_nearest_neighbor(points: List[Point]):
+def tsp_nearest_neighbor(points: List[Point] | PointArray):
+    points = as_point_array(points)
+    lats, lngs = points.lats, points.lngs
     n = len(points)
     if n == 0:
         return [], 0.0
@@ -45,7 +52,7 @@ def tsp_nearest_neighbor(points: List[Point]):
         min_dist = float("inf")
         for i in range(n):
             if not visited[i]:
-                d = haversine(points[current].lat, points[current].lng, points[i].lat, points[i].lng)
+                d = haversine(lats[current], lngs[current], lats[i], lngs[i])
                 if d < min_dist:
                     min_dist = d
                     next_index = i
@@ -56,6 +63,209 @@ def tsp_nearest_neighbor(points: List[Point]):
         total_distance += min_dist
         current = next_index
 
-    total_distance += haversine(points[current].lat, points[current].lng, points[0].lat, points[0].lng)
+    total_distance += haversine(lats[current], lngs[current], lats[0], lngs[0])
     route.append(0)
-    return route, total_distance
\ No newline at end of file
+    return route, total_distance
+
+def _path_distance(route, lats, lngs):
+    return sum(
+        haversine(lats[a], lngs[a], lats[b], lngs[b])
+        for a, b in zip(route, route[1:])
+    )
+
+# ADSA: Recursive split along the wider axis until every cell holds at most cluster_size stops.
+# The cut goes at the widest gap in the middle half of the cell rather than at the
+# median, so dense delivery areas tend to stay in one cell
+def spatial_clusters(points: PointArray, cluster_size: int):
+    lats, lngs = points.lats, points.lngs
+    clusters = []
+    pending = [list(range(len(points)))]
+    while pending:
+        cell = pending.pop()
+        if len(cell) <= cluster_size:
+            clusters.append(cell)
+            continue
+        lat_span = max(lats[i] for i in cell) - min(lats[i] for i in cell)
+        lng_span = max(lngs[i] for i in cell) - min(lngs[i] for i in cell)
+        axis = lats if lat_span >= lng_span else lngs
+        cell.sort(key=lambda i: axis[i])
+        m = len(cell)
+        cut = max(
+            range(max(1, m // 4), min(m - 1, m - m // 4) + 1),
+            key=lambda k: axis[cell[k]] - axis[cell[k - 1]],
+        )
+        pending.append(cell[:cut])
+        pending.append(cell[cut:])
+    return clusters
+
+# ADSA: 2-opt on an open path with both endpoints fixed, using nearest-neighbour candidate lists
+def _two_opt_path(route, cost, neighbours: int = 10):
+    n = len(route)
+    if n < 4:
+        return
+    nbrs = [sorted(range(n), key=row.__getitem__)[1:neighbours + 1] for row in cost]
+    pos = [0] * n
+    for idx, node in enumerate(route):
+        pos[node] = idx
+
+    def reverse(lo, hi):
+        route[lo:hi + 1] = route[lo:hi + 1][::-1]
+        for p in range(lo, hi + 1):
+            pos[route[p]] = p
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n):
+            a = route[i]
+            # Replace edges (a, succ) and (c, succ(c)) with (a, c) and (succ, succ(c))
+            if i + 1 < n:
+                b = route[i + 1]
+                for c in nbrs[a]:
+                    gain = cost[a][b] - cost[a][c]
+                    if gain <= 0:
+                        break
+                    j = pos[c]
+                    if i + 1 < j < n - 1:
+                        d = route[j + 1]
+                        if gain + cost[c][d] - cost[b][d] > 1e-9:
+                            reverse(i + 1, j)
+                            improved = True
+                            break
+            a = route[i]
+            # Replace edges (pred, a) and (pred(c), c) with (c, a) and (pred(c), pred)
+            if i > 0:
+                p = route[i - 1]
+                for c in nbrs[a]:
+                    gain = cost[p][a] - cost[a][c]
+                    if gain <= 0:
+                        break
+                    j = pos[c]
+                    if 0 < j < i - 1:
+                        e = route[j - 1]
+                        if gain + cost[e][c] - cost[e][p] > 1e-9:
+                            reverse(j, i - 1)
+                            improved = True
+                            break
+
+# ADSA: Path through one cluster from start to end (local indices) - nearest neighbour, then 2-opt
+def _solve_cluster_path(points: PointArray, start: int, end: int):
+    n = len(points)
+    cost = build_cost_matrix(points)
+    visited = [False] * n
+    visited[start] = visited[end] = True
+    route = [start]
+    current = start
+    for _ in range(n - len({start, end})):
+        row = cost[current]
+        current = min((i for i in range(n) if not visited[i]), key=row.__getitem__)
+        visited[current] = True
+        route.append(current)
+    if end != start:
+        route.append(end)
+    _two_opt_path(route, cost)
+    return route
+
+# ADSA: 2-opt restricted to route[lo..hi], the stops just outside the window stay fixed
+def _two_opt_window(route, lats, lngs, lo, hi):
+    def d(a, b):
+        return haversine(lats[a], lngs[a], lats[b], lngs[b])
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(lo, hi):
+            for k in range(i + 1, hi + 1):
+                delta = (d(route[i - 1], route[k]) + d(route[i], route[k + 1])
+                         - d(route[i - 1], route[i]) - d(route[k], route[k + 1]))
+                if delta < -1e-9:
+                    route[i:k + 1] = route[i:k + 1][::-1]
+                    improved = True
+
+def _nearest(candidates, lat, lng, lats, lngs, exclude=None):
+    return min(
+        (i for i in candidates if i != exclude),
+        key=lambda i: haversine(lat, lng, lats[i], lngs[i]),
+    )
+
+# ADSA: Hierarchical TSP for very large stop sets - cluster, order clusters, pick the
+# stops where the tour enters and leaves each cluster, solve clusters in parallel as
+# open paths between those stops, then stitch and repair the seams
+def tsp_clustered(points: List[Point] | PointArray, cluster_size: int = 500, workers: int | None = None,
+                  repair_window: int = 20, executor=None):
+    """executor, when given, is a long-lived process pool used to solve the clusters;
+    otherwise workers == 1 solves them in-process and anything else starts a
+    throwaway ProcessPoolExecutor."""
+    points = as_point_array(points)
+    n = len(points)
+    if cluster_size < 2:
+        raise ValueError("cluster_size must be at least 2")
+    if n <= cluster_size:
+        return tsp_nearest_neighbor(points)
+
+    lats, lngs = points.lats, points.lngs
+    clusters = spatial_clusters(points, cluster_size)
+
+    # The depot (stop 0) leads the first cluster so the coarse tour starts there
+    first = next(c for c in clusters if 0 in c)
+    clusters.remove(first)
+    first.remove(0)
+    clusters.insert(0, [0] + first)
+
+    # Coarse tour over cluster centroids
+    centroids = PointArray(
+        [str(k) for k in range(len(clusters))],
+        array("d", (sum(lats[i] for i in c) / len(c) for c in clusters)),
+        array("d", (sum(lngs[i] for i in c) / len(c) for c in clusters)),
+    )
+    cluster_order, _ = tsp_nearest_neighbor(centroids)
+    if len(cluster_order) > 3:
+        _two_opt_window(cluster_order, centroids.lats, centroids.lngs, 1, len(cluster_order) - 2)
+    cluster_order = cluster_order[:-1]
+
+    # Portals: leave each cluster from the stop nearest the next one, and enter
+    # the next cluster at the stop nearest that exit. The last cluster leaves
+    # towards the depot.
+    ordered = [clusters[k] for k in cluster_order]
+    entries = [0]
+    exits = []
+    for pos, cluster in enumerate(ordered):
+        entry = entries[pos]
+        if len(cluster) == 1:
+            exits.append(entry)
+        elif pos + 1 < len(ordered):
+            target = _nearest(ordered[pos + 1], centroids.lats[cluster_order[pos]], centroids.lngs[cluster_order[pos]], lats, lngs)
+            exits.append(_nearest(cluster, lats[target], lngs[target], lats, lngs, exclude=entry))
+        else:
+            exits.append(_nearest(cluster, lats[0], lngs[0], lats, lngs, exclude=entry))
+        if pos + 1 < len(ordered):
+            entries.append(_nearest(ordered[pos + 1], lats[exits[pos]], lngs[exits[pos]], lats, lngs))
+
+    sub_points = [points.take(c) for c in ordered]
+    starts = [c.index(e) for c, e in zip(ordered, entries)]
+    ends = [c.index(e) for c, e in zip(ordered, exits)]
+    if executor is not None:
+        sub_routes = list(executor.map(_solve_cluster_path, sub_points, starts, ends))
+    elif workers == 1:
+        sub_routes = list(map(_solve_cluster_path, sub_points, starts, ends))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            sub_routes = list(pool.map(_solve_cluster_path, sub_points, starts, ends))
+
+    route = []
+    junctions = []
+    for cluster, sub in zip(ordered, sub_routes):
+        if route:
+            junctions.append(len(route))
+        route.extend(cluster[i] for i in sub)
+    junctions.append(len(route))
+    route.append(0)
+
+    # Repair the seams left by stitching
+    for j in junctions:
+        lo = max(1, j - repair_window)
+        hi = min(len(route) - 2, j + repair_window)
+        if lo < hi:
+            _two_opt_window(route, lats, lngs, lo, hi)
+
+    return route, _path_distance(route, lats, lngs)
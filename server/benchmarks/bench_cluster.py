@@ -0,0 +1,48 @@
+# Compares tsp_clustered against the flat tsp_nearest_neighbor solver.
+# Run from the server directory: python -m benchmarks.bench_cluster [cluster_size] [n_points ...]
+import random
+import sys
+import time
+
+from adsa import tsp_clustered, tsp_nearest_neighbor
+from utils.pointarray import PointArray
+
+
+def uniform_instance(n, seed):
+    rng = random.Random(seed)
+    return PointArray.from_dicts(
+        {"name": f"Stop {i}", "lat": 12.8 + rng.random() * 0.4, "lng": 77.4 + rng.random() * 0.4}
+        for i in range(n)
+    )
+
+
+def hotspot_instance(n, seed, hotspots=12):
+    # Drop points bunched around a few delivery areas, closer to a real bulk import
+    rng = random.Random(seed)
+    centres = [(12.8 + rng.random() * 0.4, 77.4 + rng.random() * 0.4) for _ in range(hotspots)]
+    rows = []
+    for i in range(n):
+        lat, lng = rng.choice(centres)
+        rows.append({"name": f"Stop {i}", "lat": rng.gauss(lat, 0.01), "lng": rng.gauss(lng, 0.01)})
+    return PointArray.from_dicts(rows)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    cluster_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    sizes = [int(a) for a in sys.argv[2:]] or [2000, 5000, 10000]
+    for label, make in (("uniform", uniform_instance), ("hotspot", hotspot_instance)):
+        for n in sizes:
+            points = make(n, seed=n)
+            (_, flat_km), flat_s = timed(tsp_nearest_neighbor, points)
+            (_, clustered_km), clustered_s = timed(tsp_clustered, points, cluster_size=cluster_size)
+            print(
+                f"{label:>8} n={n:<6} flat {flat_km:9.1f} km {flat_s:7.2f} s | "
+                f"clustered {clustered_km:9.1f} km {clustered_s:7.2f} s | "
+                f"ratio {clustered_km / flat_km:.3f}"
+            )
@@ -0,0 +1,65 @@
+# Compares the Pydantic request/response codec against the columnar fast path.
+# Only decoding the request and encoding route_order/stops is measured; the solver
+# is the same code on both paths and is left out.
+# Run from the server directory: python -m benchmarks.bench_points [n_points ...]
+import json
+import random
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+
+from utils.fmodels import RouteRequest
+from utils.pointarray import decode_route_request, dumps
+
+REPEATS = 7
+
+
+def make_body(n):
+    rng = random.Random(42)
+    points = [
+        {"name": f"Stop {i}", "lat": 12.9 + rng.random() * 0.2, "lng": 77.5 + rng.random() * 0.2}
+        for i in range(n)
+    ]
+    return json.dumps({"truck_id": "T1", "algorithm": "shortest", "points": points}).encode()
+
+
+def visit_order(n):
+    order = list(range(n))
+    random.Random(7).shuffle(order)
+    return order + [order[0]]
+
+
+# What FastAPI does for /calculate-route/: json.loads, RouteRequest, jsonable_encoder, json.dumps
+def model_path(body, order):
+    request = RouteRequest(**json.loads(body))
+    ordered = [request.points[i] for i in order]
+    return json.dumps(jsonable_encoder({"route_order": ordered, "stops": request.points})).encode()
+
+
+def fast_path(body, order):
+    _, _, points = decode_route_request(body)
+    return dumps({"route_order": points.take(order).to_dicts(), "stops": points.to_dicts()})
+
+
+def peak_memory(fn, *args):
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 5000, 20000]
+    for n in sizes:
+        body, order = make_body(n), visit_order(n)
+        for label, fn in (("pydantic", model_path), ("columnar", fast_path)):
+            runs = timeit.repeat(lambda: fn(body, order), number=1, repeat=REPEATS)
+            peak = peak_memory(fn, body, order)
+            print(
+                f"{label:>9}: n={n:<6} min {min(runs) * 1000:8.1f} ms  "
+                f"median {statistics.median(runs) * 1000:8.1f} ms  peak {peak / 1024:9.1f} KiB"
+            )
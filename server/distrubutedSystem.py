@@ -1,6 +1,6 @@
 import aiohttp
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn  # Importing uvicorn
 
 # List of backend servers to handle requests in round-robin fashion
@@ -33,14 +33,11 @@ async def round_robin_proxy(request: Request, backend_servers):
                 params=request.query_params,
                 data=body if body else None,  # Use 'data' instead of 'json' for raw body content
             ) as resp:
-                # Handle non-JSON responses
-                try:
-                    response_data = await resp.json()
-                except Exception:
-                    response_data = await resp.text()  # fallback to text if JSON parsing fails
+                # Pass the backend body through as-is instead of parsing and re-encoding it
+                content = await resp.read()
 
                 # Return the response from the backend server to the client
-                return JSONResponse(status_code=resp.status, content=response_data)
+                return Response(status_code=resp.status, content=content, media_type=resp.content_type)
         except Exception as e:
             # Handle errors like connection issues
             return JSONResponse(status_code=500, content={"detail": f"Error forwarding request: {str(e)}"})
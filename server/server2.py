@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List
@@ -11,19 +11,36 @@ import os
 from datetime import date, datetime
 import asyncio
 import aiohttp
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from adsa import tsp_nearest_neighbor,build_cost_matrix
+from adsa import tsp_nearest_neighbor,build_cost_matrix,tsp_clustered
 from utils.fmodels import Point, RouteRequest, LoginRequest, LoginResponse, RouteSegment, TruckResponse, EachRoute, CombinedRoute, AllTruckResponse,TruckModel
-from utils.externalapi import get_osrm_route_geometry, fetch_nearby_pois
+from utils.externalapi import fetch_route_geometry, fetch_nearby_pois
+from utils.pointarray import PointArray, decode_route_request, dumps
+from utils.authcache import TruckCache, bearer_claims, sign_token, token_secret
+from utils.routestore import RouteWriteBuffer, compact_route_document, google_maps_segment_url, route_segments_from_document
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 mongo_url = os.getenv("MONGO_URL")
+CLUSTER_SIZE = int(os.getenv("CLUSTER_SIZE", "500"))
+if CLUSTER_SIZE < 2:
+    raise ValueError(f"CLUSTER_SIZE must be at least 2, got {CLUSTER_SIZE}")
 
 MONGO_URL = mongo_url
-client = MongoClient(MONGO_URL)
-db = client.truck_db
-users_collection = db.users
-routes_collection = db.routes
+
+# Created in the startup hook rather than at import: the clustered solver's spawned
+# workers re-import this module as __main__ and must not open their own connections
+client = None
+users_collection = None
+routes_collection = None
+route_writer = None
+truck_cache = None
+TOKEN_SECRET = None
+solver_pool = None
 
 app = FastAPI()
 
@@ -41,10 +58,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def connect_services():
+    global client, users_collection, routes_collection, route_writer, truck_cache, TOKEN_SECRET
+    client = MongoClient(MONGO_URL)
+    db = client.truck_db
+    users_collection = db.users
+    routes_collection = db.routes
+    route_writer = RouteWriteBuffer(routes_collection)
+    truck_cache = TruckCache(users_collection, db.meta)
+    TOKEN_SECRET = token_secret()
+
+@app.on_event("startup")
+async def start_route_writer():
+    route_writer.start()
+
+@app.on_event("shutdown")
+async def stop_route_writer():
+    await route_writer.stop()
+
+# One pool for the clustered solver, created once; spawn avoids forking a process
+# that already holds the MongoClient and worker threads
+@app.on_event("startup")
+async def start_solver_pool():
+    global solver_pool
+    solver_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+
+@app.on_event("shutdown")
+async def stop_solver_pool():
+    if solver_pool is not None:
+        await asyncio.to_thread(solver_pool.shutdown)
+
+@app.on_event("shutdown")
+async def close_services():
+    if client is not None:
+        client.close()
+
 @app.post("/login", response_model=LoginResponse)
 async def login(request: LoginRequest):
     try:
-        truck = users_collection.find_one({"truck_id": request.truck_id})  
+        truck = truck_cache.get(request.truck_id)
         if not truck:
             raise HTTPException(status_code=401, detail="Invalid Truck ID or Truck Number")
         
@@ -53,87 +106,90 @@ async def login(request: LoginRequest):
         
         role = truck.get("role", "user")
 
-        return LoginResponse(success=True, token=request.truck_id,role = role)
+        access_token = sign_token({"truck_id": truck["truck_id"], "truck_number": truck["truck_number"]}, TOKEN_SECRET)
+
+        return LoginResponse(success=True, token=request.truck_id,role = role, access_token=access_token)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
-@app.post("/calculate-route/")
-async def calculate_route(request: RouteRequest):
-    print("Let me calculate")
-    if len(request.points) < 2:
+async def plan_route(truck_id: str, algorithm: str, points: PointArray):
+    if len(points) < 2:
         raise HTTPException(status_code=400, detail="At least two points are required.")
 
-    if request.algorithm == "shortest":
-        route_indices, approx_distance = tsp_nearest_neighbor(request.points)
-        ordered_points = [request.points[i] for i in route_indices]
+    if algorithm in ("shortest", "clustered"):
+        # Solve off the event loop so other requests and the route writer keep running
+        if algorithm == "clustered":
+            route_indices, approx_distance = await asyncio.to_thread(tsp_clustered, points, cluster_size=CLUSTER_SIZE, executor=solver_pool)
+        else:
+            route_indices, approx_distance = await asyncio.to_thread(tsp_nearest_neighbor, points)
+        ordered_points = points.take(route_indices)
+        names, lats, lngs = ordered_points.names, ordered_points.lats, ordered_points.lngs
 
-        full_coords = []
-        for i in range(len(ordered_points) - 1):
-            geometry = get_osrm_route_geometry(ordered_points[i], ordered_points[i + 1])
-            coords = geometry["coordinates"]
-            if full_coords and full_coords[-1] == coords[0]:
-                full_coords.extend(coords[1:])
-            else:
-                full_coords.extend(coords)
-
-        route_geometry = {
-            "type": "LineString",
-            "coordinates": full_coords
-        }
+        route_geometry = await fetch_route_geometry([ordered_points[i] for i in range(len(ordered_points))])
 
         # Generate Google Maps Links for Each Segment (No Round Trip)
         segment_links = []
-        route_segments =[]
         for i in range(len(ordered_points) - 1):
-            segment_url = f"https://www.google.com/maps/dir/?api=1&origin={ordered_points[i].lat},{ordered_points[i].lng}&destination={ordered_points[i + 1].lat},{ordered_points[i + 1].lng}&travelmode=driving"
+            segment_url = google_maps_segment_url(lats[i], lngs[i], lats[i + 1], lngs[i + 1])
             segment_links.append({
-                "from": ordered_points[i].name,
-                "to": ordered_points[i + 1].name,
+                "from": names[i],
+                "to": names[i + 1],
                 "google_maps_url": segment_url
             })
-            route_segments.append(RouteSegment(
-                from_location=ordered_points[i].name,
-                to_location=ordered_points[i + 1].name,
-                google_maps_url=segment_url
-            ))
 
         restaurants, petrol_bunks = await asyncio.gather(
             fetch_nearby_pois(route_geometry, "restaurant"),
             fetch_nearby_pois(route_geometry, "fuel")
         )
 
-        today = date.today()
-
-        route_data = {
-            "truck_id": request.truck_id,
-            "segments": [segment.dict() for segment in route_segments],
-            "total_distance": approx_distance,
-            "date": datetime.now()
-        }
-        routes_collection.insert_one(route_data)
+        # Stored compactly (stops + visit order) and written in batches off the request path
+        await route_writer.submit(compact_route_document(truck_id, points, route_indices, approx_distance, datetime.now()))
 
         return {
-            "algorithm": request.algorithm,
+            "algorithm": algorithm,
             "approx_distance": approx_distance,
-            "route_order": ordered_points,
+            "route_order": ordered_points.to_dicts(),
             "route_geometry": route_geometry,
             "segment_links": segment_links,
-            "stops":request.points,
+            "stops": points.to_dicts(),
             "petrol_bunks": petrol_bunks,
             "restaurants": restaurants
         }
     else:
         raise HTTPException(status_code=400, detail="Unsupported algorithm")
 
+@app.post("/calculate-route/")
+async def calculate_route(request: RouteRequest):
+    print("Let me calculate")
+    return await plan_route(request.truck_id, request.algorithm, PointArray.from_points(request.points))
+
+# Fast path: decodes the body straight into columns (no per-point models) and encodes with orjson
+@app.post("/calculate-route/fast")
+async def calculate_route_fast(request: Request):
+    try:
+        truck_id, algorithm, points = decode_route_request(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    result = await plan_route(truck_id, algorithm, points)
+    return Response(content=dumps(result), media_type="application/json")
+
 @app.get("/get-truck-details/{truck_id}", response_model=TruckResponse)
-async def get_truck_details(truck_id: str):
+async def get_truck_details(truck_id: str, authorization: str | None = Header(default=None)):
     try:
         if not truck_id:
             raise HTTPException(status_code=401, detail="No truck Id found")
         
-        truck = users_collection.find_one({"truck_id": truck_id})
+        # Not authentication: the endpoint stays open. A valid signed token for this
+        # truck is only a hint that already carries its profile, so the user lookup
+        # can be skipped; route history is still read from Mongo every time
+        claims = bearer_claims(authorization, TOKEN_SECRET)
+        if claims and claims.get("truck_id") == truck_id:
+            truck = claims
+        else:
+            truck = truck_cache.get(truck_id)
         
         if not truck:
             return TruckResponse(success=False, truck_id="", truck_number="", routes=[])
@@ -146,9 +202,10 @@ async def get_truck_details(truck_id: str):
         # Convert recent_travels to a list of CombinedRoute instances
         formatted_routes = []
         for travel in recent_travels:
-            if "segments" in travel and isinstance(travel["segments"],list):
+            segments = route_segments_from_document(travel)
+            if segments is not None:
                 segment_routes = []
-                for i in travel["segments"]:
+                for i in segments:
                     segment_routes.append(EachRoute(start = i["from_location"],end = i["to_location"],google_maps_url=i["google_maps_url"]))
                 
                 formatted_routes.append(CombinedRoute(combine=segment_routes,total_distance = travel["total_distance"],date = travel["date"]))
@@ -192,18 +249,25 @@ async def add_truck(request: dict):
         }
         users_collection.insert_one(user_data)
 
-        return {"message": "Truck added successfully"}
-
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+    # The truck is stored at this point; a failed cache invalidation must not turn
+    # that into an error the client would retry (there is no unique index on truck_id)
+    try:
+        truck_cache.invalidate(truck_id)
+    except Exception as e:
+        logger.warning("Failed to invalidate truck cache for %s: %s", truck_id, e)
+
+    return {"message": "Truck added successfully"}
+
 @app.get("/admin/get-truck-details/{truck_id}", response_model=TruckResponse)
 async def get_truck_details(truck_id: str):
     try:
         if not truck_id:
             raise HTTPException(status_code=401, detail="No truck Id found")
         
-        truck = users_collection.find_one({"truck_id": truck_id})
+        truck = truck_cache.get(truck_id)
         
         if not truck:
             return TruckResponse(success=False, truck_id="", truck_number="", routes=[])
@@ -215,9 +279,10 @@ async def get_truck_details(truck_id: str):
 
         formatted_routes = []
         for travel in recent_travels:
-            if "segments" in travel and isinstance(travel["segments"],list):
+            segments = route_segments_from_document(travel)
+            if segments is not None:
                 segment_routes = []
-                for i in travel["segments"]:
+                for i in segments:
                     segment_routes.append(EachRoute(start = i["from_location"],end = i["to_location"],google_maps_url=i["google_maps_url"]))
                 
                 formatted_routes.append(CombinedRoute(combine=segment_routes,total_distance = travel["total_distance"],date = travel["date"]))
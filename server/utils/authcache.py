@@ -0,0 +1,132 @@
+# In-process truck profile cache and signed login tokens
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+USERS_VERSION_ID = "users_version"
+
+
+class TruckCache:
+    """TTL cache for truck profiles from users_collection.
+
+    Invalidation is shared between backends through a version counter stored in
+    meta_collection: invalidate() bumps it, and every backend polls it at most
+    once per poll_interval, dropping its whole cache when the version changed.
+    A polling counter is used instead of a change stream because change streams
+    need a replica set.
+
+    Unknown ids are cached for the shorter miss_ttl, and the cache holds at most
+    max_entries profiles, evicting the least recently used one.
+    """
+
+    def __init__(self, users_collection, meta_collection, ttl: float = 60.0, miss_ttl: float = 5.0,
+                 poll_interval: float = 2.0, max_entries: int = 10000):
+        self.users_collection = users_collection
+        self.meta_collection = meta_collection
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.poll_interval = poll_interval
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._last_poll = 0.0
+
+    def get(self, truck_id: str):
+        self._check_version()
+        now = time.monotonic()
+        entry = self._entries.get(truck_id)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(truck_id)
+            return entry[1]
+
+        # Misses are cached too, so unknown ids do not hit Mongo on every poll
+        truck = self.users_collection.find_one({"truck_id": truck_id}, {"_id": 0})
+        self._entries[truck_id] = (now + (self.ttl if truck else self.miss_ttl), truck)
+        self._entries.move_to_end(truck_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return truck
+
+    def invalidate(self, truck_id: str | None = None):
+        if truck_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(truck_id, None)
+        result = self.meta_collection.find_one_and_update(
+            {"_id": USERS_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        version = result["version"] if result else None
+        # Anything other than our own bump means another backend changed users
+        # since we last polled, so entries cached before that are stale too
+        if self._version is None or version != self._version + 1:
+            self._entries.clear()
+        self._version = version
+        self._last_poll = time.monotonic()
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        doc = self.meta_collection.find_one({"_id": USERS_VERSION_ID})
+        version = doc["version"] if doc else 0
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def token_secret() -> bytes:
+    # Both backends must share TOKEN_SECRET, otherwise each only accepts its own tokens
+    secret = os.getenv("TOKEN_SECRET")
+    if not secret:
+        logger.warning(
+            "TOKEN_SECRET is not set, using a random per-process secret. Behind the "
+            "round-robin proxy about half of all access tokens will be rejected by "
+            "the other backend; set the same TOKEN_SECRET on every backend."
+        )
+        return os.urandom(32)
+    return secret.encode()
+
+
+def sign_token(claims: dict, secret: bytes, ttl: float = 7 * 24 * 3600) -> str:
+    payload = _b64encode(json.dumps({**claims, "exp": int(time.time() + ttl)}, separators=(",", ":")).encode())
+    signature = _b64encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+    return f"{payload}.{signature}"
+
+
+def verify_token(token: str, secret: bytes):
+    """Returns the token claims, or None if the token is malformed, tampered with or expired."""
+    try:
+        payload, signature = token.split(".")
+        expected = _b64encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(signature, expected):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict) or claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+def bearer_claims(authorization: str | None, secret: bytes):
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    return verify_token(authorization[len("Bearer "):], secret)
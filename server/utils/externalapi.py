@@ -7,8 +7,17 @@ from fastapi import FastAPI, HTTPException
 
 OVERPASS_URL = "http://overpass-api.de/api/interpreter"
 
+OSRM_URL = "http://router.project-osrm.org/route/v1/driving"
+OSRM_MAX_WAYPOINTS = 100
+OSRM_CONCURRENCY = 4
+
 def get_osrm_route_geometry(start: Point, end: Point):
-    url = f"http://router.project-osrm.org/route/v1/driving/{start.lng},{start.lat};{end.lng},{end.lat}?overview=full&geometries=geojson"
+    return get_osrm_path_geometry([start, end])
+
+# One OSRM request for a whole run of consecutive stops instead of one per segment
+def get_osrm_path_geometry(stops):
+    waypoints = ";".join(f"{stop.lng},{stop.lat}" for stop in stops)
+    url = f"{OSRM_URL}/{waypoints}?overview=full&geometries=geojson"
     response = requests.get(url)
     if response.status_code == 200:
         data = response.json()
@@ -19,6 +28,33 @@ def get_osrm_route_geometry(start: Point, end: Point):
     else:
         raise HTTPException(status_code=response.status_code, detail="OSRM API request failed")
 
+# Road geometry for the ordered stops: chunks of up to OSRM_MAX_WAYPOINTS stops that
+# share their end stops, fetched off the event loop with at most OSRM_CONCURRENCY
+# requests in flight, then joined in order
+async def fetch_route_geometry(stops):
+    step = OSRM_MAX_WAYPOINTS - 1
+    chunks = [stops[i:i + OSRM_MAX_WAYPOINTS] for i in range(0, len(stops) - 1, step)]
+    semaphore = asyncio.Semaphore(OSRM_CONCURRENCY)
+
+    async def fetch(chunk):
+        async with semaphore:
+            return await asyncio.to_thread(get_osrm_path_geometry, chunk)
+
+    geometries = await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+
+    full_coords = []
+    for geometry in geometries:
+        coords = geometry["coordinates"]
+        if full_coords and coords and full_coords[-1] == coords[0]:
+            full_coords.extend(coords[1:])
+        else:
+            full_coords.extend(coords)
+
+    return {
+        "type": "LineString",
+        "coordinates": full_coords
+    }
+
 async def fetch_nearby_pois(route_geometry, poi_type: str):
     query = "[out:json];("
     coordinates = route_geometry["coordinates"]
@@ -22,6 +22,7 @@ class LoginResponse(BaseModel):
     success: bool
     token: str | None = None
     role:str | None = None
+    access_token: str | None = None
 
 class RouteSegment(BaseModel):
     from_location: str
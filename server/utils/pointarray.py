@@ -0,0 +1,125 @@
+# Compact columnar storage for route stops and a fast JSON codec for the route API
+import json
+from array import array
+from typing import Iterable, List, NamedTuple
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+
+def _coerce_float(value, index: int, field: str) -> float:
+    # Same lax coercion as a Pydantic float field: numbers, bools and numeric strings
+    if isinstance(value, (bool, int, float, str)):
+        try:
+            return float(value)
+        except (ValueError, OverflowError):
+            pass
+    raise ValueError(f"Invalid point {index}: {field} must be a number")
+
+
+class Stop(NamedTuple):
+    name: str
+    lat: float
+    lng: float
+
+
+class PointArray:
+    """Stops held as parallel columns: contiguous lat/lng float arrays plus a names list.
+
+    Built once at the API boundary so the solvers and geometry code index plain
+    floats instead of touching a Pydantic model per stop.
+    """
+
+    __slots__ = ("names", "lats", "lngs")
+
+    def __init__(self, names: List[str], lats: array, lngs: array):
+        if not (len(names) == len(lats) == len(lngs)):
+            raise ValueError("names, lats and lngs must have the same length")
+        self.names = names
+        self.lats = lats
+        self.lngs = lngs
+
+    @classmethod
+    def from_points(cls, points: Iterable) -> "PointArray":
+        # Accepts anything with name/lat/lng attributes (Pydantic Point, Stop, ...)
+        names, lats, lngs = [], array("d"), array("d")
+        for p in points:
+            names.append(p.name)
+            lats.append(p.lat)
+            lngs.append(p.lng)
+        return cls(names, lats, lngs)
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[dict]) -> "PointArray":
+        # Accepts exactly what the Point model accepts, so both route endpoints validate alike
+        names, lats, lngs = [], array("d"), array("d")
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                raise ValueError(f"Invalid point {i}: expected an object")
+            name = row.get("name")
+            if not isinstance(name, str):
+                raise ValueError(f"Invalid point {i}: name must be a string")
+            names.append(name)
+            lats.append(_coerce_float(row.get("lat"), i, "lat"))
+            lngs.append(_coerce_float(row.get("lng"), i, "lng"))
+        return cls(names, lats, lngs)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i: int) -> Stop:
+        return Stop(self.names[i], self.lats[i], self.lngs[i])
+
+    def take(self, indices: Iterable[int]) -> "PointArray":
+        indices = list(indices)
+        return PointArray(
+            [self.names[i] for i in indices],
+            array("d", (self.lats[i] for i in indices)),
+            array("d", (self.lngs[i] for i in indices)),
+        )
+
+    def to_dicts(self) -> List[dict]:
+        return [
+            {"name": name, "lat": lat, "lng": lng}
+            for name, lat, lng in zip(self.names, self.lats, self.lngs)
+        ]
+
+
+def as_point_array(points) -> PointArray:
+    if isinstance(points, PointArray):
+        return points
+    return PointArray.from_points(points)
+
+
+def loads(body: bytes):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def decode_route_request(body: bytes):
+    """Parse a /calculate-route/ payload straight into (truck_id, algorithm, PointArray)."""
+    try:
+        payload = loads(body)
+    except ValueError as e:
+        raise ValueError(f"Malformed JSON: {e}") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Request body must be a JSON object")
+
+    truck_id = payload.get("truck_id")
+    algorithm = payload.get("algorithm")
+    points = payload.get("points")
+    if not isinstance(truck_id, str) or not isinstance(algorithm, str):
+        raise ValueError("truck_id and algorithm must be strings")
+    if not isinstance(points, list):
+        raise ValueError("points must be a list")
+
+    return truck_id, algorithm, PointArray.from_dicts(points)
@@ -0,0 +1,148 @@
+# Route history persistence: compact storage schema and a write-behind insert buffer
+import asyncio
+import logging
+from datetime import datetime
+from typing import List
+
+from pymongo.errors import BulkWriteError
+
+from utils.pointarray import PointArray
+
+logger = logging.getLogger(__name__)
+
+COMPACT_SCHEMA_VERSION = 2
+
+
+def google_maps_segment_url(lat1, lng1, lat2, lng2):
+    return f"https://www.google.com/maps/dir/?api=1&origin={lat1},{lng1}&destination={lat2},{lng2}&travelmode=driving"
+
+
+def compact_route_document(truck_id: str, points: PointArray, route_indices: List[int], total_distance: float, date: datetime):
+    """Stores each stop once plus the visit order; segment names and URLs are rebuilt on read."""
+    return {
+        "truck_id": truck_id,
+        "v": COMPACT_SCHEMA_VERSION,
+        "stops": [[name, lat, lng] for name, lat, lng in zip(points.names, points.lats, points.lngs)],
+        "order": list(route_indices),
+        "total_distance": total_distance,
+        "date": date,
+    }
+
+
+def route_segments_from_document(doc):
+    """Returns the segments of a stored route as from_location/to_location/google_maps_url dicts.
+
+    Handles both compact documents and legacy ones that embed full segments.
+    Returns None when the document has neither.
+    """
+    if doc.get("v") == COMPACT_SCHEMA_VERSION:
+        stops, order = doc.get("stops"), doc.get("order")
+        if not isinstance(stops, list) or not isinstance(order, list):
+            return None
+        segments = []
+        for a, b in zip(order, order[1:]):
+            from_name, from_lat, from_lng = stops[a]
+            to_name, to_lat, to_lng = stops[b]
+            segments.append({
+                "from_location": from_name,
+                "to_location": to_name,
+                "google_maps_url": google_maps_segment_url(from_lat, from_lng, to_lat, to_lng),
+            })
+        return segments
+
+    if "segments" in doc and isinstance(doc["segments"], list):
+        return doc["segments"]
+    return None
+
+
+class RouteWriteBuffer:
+    """Write-behind buffer that groups route documents into periodic insert_many batches.
+
+    submit() only waits when the queue is full (max_queue), which applies
+    backpressure instead of growing memory without bound. stop() flushes
+    everything still queued, so call it from the app shutdown hook.
+    A failed batch is retried with exponential backoff up to max_attempts
+    times before its documents are logged and dropped.
+    """
+
+    def __init__(self, collection, max_batch: int = 200, flush_interval: float = 1.0, max_queue: int = 10000,
+                 max_attempts: int = 5, retry_backoff: float = 0.5):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._stopping = False
+        self._idle = True
+        self._wake = asyncio.Event()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wake.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping = True
+            if self._idle:
+                # Waiting on an empty queue, nothing is in flight
+                self._task.cancel()
+            else:
+                # Let the current batch finish writing (retries included) before draining,
+                # so the same documents are never inserted from two places at once
+                self._wake.set()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Drain whatever is left after the background loop stops
+        while not self.queue.empty():
+            await self._write(self._take_batch([]))
+
+    async def submit(self, doc: dict):
+        await self.queue.put(doc)
+
+    def _take_batch(self, batch):
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while not self._stopping:
+            self._idle = True
+            doc = await self.queue.get()
+            self._idle = False
+            # Wait for more routes to accumulate unless a full batch is already queued
+            if self.queue.qsize() < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self._write(self._take_batch([doc]))
+
+    async def _write(self, batch):
+        for attempt in range(self.max_attempts):
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self.collection.insert_many, batch, ordered=False)
+                return
+            except BulkWriteError as e:
+                # insert_many assigns _id in place, so documents stored by an earlier
+                # attempt come back as duplicate key errors (11000) and count as written
+                failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+                batch = [doc for i, doc in enumerate(batch) if i in failed]
+                error = e
+            except Exception as e:
+                error = e
+            if batch and attempt + 1 < self.max_attempts:
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning("Failed to write %d routes (attempt %d), retrying in %.1fs: %s", len(batch), attempt + 1, delay, error)
+                await asyncio.sleep(delay)
+        if batch:
+            dropped = ", ".join(f"{doc.get('truck_id')}@{doc.get('date')}" for doc in batch)
+            logger.error("Dropping %d routes after %d attempts: %s (truck_id@date: %s)", len(batch), self.max_attempts, error, dropped)